@@ -10,7 +10,7 @@ from pymongo import DESCENDING
 from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
-from typing import Union, List, Dict, Any
+from typing import Union, List, Dict, Any, Tuple
 from pydantic import BaseModel
 
 # Load environment variables from .env file
@@ -55,9 +55,23 @@ def get_documents(collection_name: str, filter_dict: dict = None, limit: int = N
     
     return list(cursor)
 
-def get_recent_documents(collection_name: str, filter_dict: Dict[str, Any] | None = None, limit: int = 10) -> List[Dict[str, Any]]:
-    """Get most recent documents sorted by created_at desc"""
+def get_recent_documents(
+    collection_name: str,
+    filter_dict: Dict[str, Any] | None = None,
+    limit: int = 10,
+    projection: Dict[str, Any] | None = None,
+    sort: List[Tuple[str, int]] | None = None,
+) -> List[Dict[str, Any]]:
+    """Get most recent documents (created_at desc unless `sort` is given), optionally projected"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    cursor = db[collection_name].find(filter_dict or {}).sort("created_at", DESCENDING).limit(limit)
+    cursor = db[collection_name].find(filter_dict or {}, projection).sort(sort or [("created_at", DESCENDING)]).limit(limit)
     return list(cursor)
+
+def get_collection_version(collection_name: str):
+    """Get (latest _id, document count) for a collection; changes on every insert or delete"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    collection = db[collection_name]
+    doc = collection.find_one({}, projection={"_id": 1}, sort=[("_id", DESCENDING)])
+    return (doc["_id"] if doc else None), collection.estimated_document_count()
@@ -1,31 +1,144 @@
+import asyncio
+import logging
 import os
-from fastapi import FastAPI, HTTPException
+import time
+from contextlib import asynccontextmanager
+from enum import Enum
+import anyio.to_thread
+import msgspec
+import orjson
+import pymongo
+from bson import ObjectId
+from fastapi import BackgroundTasks, Depends, FastAPI, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import Optional
-from database import create_document, get_recent_documents
+from pymongo import DESCENDING
+from typing import Annotated
+from database import db, create_document, get_recent_documents, get_collection_version
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
+# Read once at startup (database import above has already loaded .env)
+_DB_URL_SET = bool(os.getenv("DATABASE_URL"))
+_DB_NAME_SET = bool(os.getenv("DATABASE_NAME"))
+# Seconds the startup warm-up ping may take before we serve (with mock fallbacks)
+_STARTUP_PING_TIMEOUT = 2
+
+# Comma-separated CORS allowlist; unset means any origin (without credentials)
+ALLOWED_ORIGINS = [o.strip() for o in os.getenv("ALLOWED_ORIGINS", "").split(",") if o.strip()]
+
+def _orjson_default(obj):
+    """orjson fallback for Mongo types it does not know about"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError
+
+class MongoJSONResponse(ORJSONResponse):
+    """ORJSONResponse that also serializes bson ObjectIds as hex strings"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_orjson_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
+
+def _ping_db() -> None:
+    """Bounded warm-up ping; an unreachable Mongo must not stall startup"""
+    with pymongo.timeout(_STARTUP_PING_TIMEOUT):
+        db.command("ping")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Raise the threadpool limit and open the Mongo connection before serving"""
+    # Default is 40 tokens, shared by sync endpoints and run_in_threadpool calls
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 100
+    if db is not None:
+        try:
+            await run_in_threadpool(_ping_db)
+        except Exception:
+            logger.warning("MongoDB ping failed at startup", exc_info=True)
+    yield
+
+app = FastAPI(default_response_class=MongoJSONResponse, lifespan=lifespan)
+
+# No cookies/auth are used, so credentials stay off ("*" + credentials is
+# rejected by browsers anyway). max_age lets browsers cache preflights.
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=ALLOWED_ORIGINS or ["*"],
+    allow_credentials=False,
+    allow_methods=["GET", "POST"],
+    allow_headers=["content-type", "if-none-match"],
+    expose_headers=["ETag"],
+    max_age=86400,
 )
 
-@app.get("/")
-def read_root():
-    return {"message": "Hello from FastAPI Backend!"}
+# Constant payloads are encoded once at import; only a fresh Response wrapper
+# is built per request (middleware may add headers to it). Bump the ETag
+# whenever the content changes.
+_CONSTANT_CACHE_CONTROL = "public, max-age=300"
+_ROOT_BODY = orjson.dumps({"message": "Hello from FastAPI Backend!"})
+_ROOT_ETAG = 'W/"root-v1"'
+_HELLO_BODY = orjson.dumps({"message": "Hello from the backend API!"})
+_HELLO_ETAG = 'W/"hello-v1"'
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match check: comma-separated list, weak comparison, '*' matches"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    opaque = etag.removeprefix("W/")
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+def _constant_response(request: Request, body: bytes, etag: str) -> Response:
+    headers = {"Cache-Control": _CONSTANT_CACHE_CONTROL, "ETag": etag}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/", response_model=None)
+async def read_root(request: Request):
+    return _constant_response(request, _ROOT_BODY, _ROOT_ETAG)
+
+@app.get("/api/hello", response_model=None)
+async def hello(request: Request):
+    return _constant_response(request, _HELLO_BODY, _HELLO_ETAG)
 
-@app.get("/api/hello")
-def hello():
-    return {"message": "Hello from the backend API!"}
+# Short-lived cache for /test so health-check floods don't hit MongoDB every time
+_TEST_CACHE_TTL = 5.0
+_TEST_CACHE = {"t": 0.0, "resp": None}
+# Serializes refreshes so concurrent misses make a single DB call
+_TEST_CACHE_LOCK = asyncio.Lock()
+
+def _cached_test_response():
+    if _TEST_CACHE["resp"] is not None and time.monotonic() - _TEST_CACHE["t"] < _TEST_CACHE_TTL:
+        return _TEST_CACHE["resp"]
+    return None
 
 @app.get("/test")
-def test_database():
+async def test_database():
     """Test endpoint to check if database is available and accessible"""
+    cached = _cached_test_response()
+    if cached is not None:
+        return cached
+    async with _TEST_CACHE_LOCK:
+        # Another request may have refreshed the cache while we waited
+        cached = _cached_test_response()
+        if cached is None:
+            cached = await _build_test_response()
+            # Stamp after the (possibly slow) DB check so the entry starts fresh
+            _TEST_CACHE["t"] = time.monotonic()
+            _TEST_CACHE["resp"] = cached
+    return cached
+
+async def _build_test_response() -> dict:
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -47,7 +160,7 @@ def test_database():
             
             # Try to list collections to verify connectivity
             try:
-                collections = db.list_collection_names()
+                collections = await run_in_threadpool(db.list_collection_names)
                 response["collections"] = collections[:10]  # Show first 10 collections
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -61,117 +174,219 @@ def test_database():
         response["database"] = f"❌ Error: {str(e)[:50]}"
     
     # Check environment variables
-    import os
-    response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
-    response["database_name"] = "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set"
-    
+    response["database_url"] = "✅ Set" if _DB_URL_SET else "❌ Not Set"
+    response["database_name"] = "✅ Set" if _DB_NAME_SET else "❌ Not Set"
+
     return response
 
 # ----- Tone & Sentiment Workflow API -----
-class GenerateRequest(BaseModel):
-    prompt: str = Field(..., description="User prompt for generation")
-    tone: str = Field(..., description="Tone (Professional, Playful, Formal, Casual, etc.)")
-    sentiment: str = Field(..., description="Sentiment (Positive, Neutral, Urgent)")
-    length: str = Field("Medium", description="Short | Medium | Long")
-    creativity: float = Field(0.35, ge=0.0, le=1.0)
-    variants: int = Field(1, ge=1, le=5)
-
-class GenerateResponse(BaseModel):
+# Static lookup tables for the heuristic generator, built once at import
+class Tone(str, Enum):
+    PROFESSIONAL = "Professional"
+    PLAYFUL = "Playful"
+    FORMAL = "Formal"
+    CASUAL = "Casual"
+
+class Sentiment(str, Enum):
+    POSITIVE = "Positive"
+    NEUTRAL = "Neutral"
+    URGENT = "Urgent"
+
+_TONE_VOICE = {
+    Tone.PROFESSIONAL: "Polished and concise.",
+    Tone.PLAYFUL: "Light and witty.",
+    Tone.FORMAL: "Respectful and structured.",
+    Tone.CASUAL: "Friendly and direct.",
+}
+
+_SENTIMENT_HINT = {
+    Sentiment.POSITIVE: "Emphasize benefits and momentum.",
+    Sentiment.NEUTRAL: "Stay informative and balanced.",
+    Sentiment.URGENT: "Use action-forward phrasing.",
+}
+
+_LENGTH_MAP = {
+    "Short": (18, 26),
+    "Medium": (40, 60),
+    "Long": (80, 120),
+}
+
+_FILLERS = ("Learn more.", "Discover why.", "Built for teams.", "Effortless.", "Reliable.")
+# _FILLER_PREFIX[n] is the first n fillers already joined
+_FILLER_PREFIX = tuple(" ".join(_FILLERS[:i]) for i in range(len(_FILLERS) + 1))
+
+class GenerateRequest(msgspec.Struct):
+    prompt: Annotated[str, msgspec.Meta(description="User prompt for generation")]
+    tone: Annotated[Tone, msgspec.Meta(description="Tone (Professional, Playful, Formal, Casual)")]
+    sentiment: Annotated[Sentiment, msgspec.Meta(description="Sentiment (Positive, Neutral, Urgent)")]
+    length: Annotated[str, msgspec.Meta(description="Short | Medium | Long")] = "Medium"
+    creativity: Annotated[float, msgspec.Meta(ge=0.0, le=1.0)] = 0.35
+    variants: Annotated[int, msgspec.Meta(ge=1, le=5)] = 1
+
+class GenerateResponse(msgspec.Struct):
     id: str
     outputs: list[str]
 
-@app.post("/api/generate", response_model=GenerateResponse)
-async def generate_content(payload: GenerateRequest):
+class MsgspecJSONResponse(JSONResponse):
+    """JSON response encoded with msgspec (handles Structs natively)"""
+
+    def render(self, content) -> bytes:
+        return msgspec.json.encode(content)
+
+# The body is parsed by msgspec rather than FastAPI, so publish the schemas to
+# OpenAPI ourselves (merged into components by _openapi below)
+(_GENERATE_REQUEST_SCHEMA, _GENERATE_RESPONSE_SCHEMA), _MSGSPEC_COMPONENTS = msgspec.json.schema_components(
+    (GenerateRequest, GenerateResponse), ref_template="#/components/schemas/{name}"
+)
+
+async def parse_generate_request(request: Request) -> GenerateRequest:
+    """Decode and validate the request body in a single msgspec pass"""
+    try:
+        # strict=False matches the old pydantic coercions ("2", "0.5", 2.0 for numbers)
+        return msgspec.json.decode(await request.body(), type=GenerateRequest, strict=False)
+    except msgspec.DecodeError as e:
+        # Keep FastAPI's list-of-errors shape; msgspec's message carries the path
+        error_type = "value_error" if isinstance(e, msgspec.ValidationError) else "json_invalid"
+        raise RequestValidationError([{"type": error_type, "loc": ("body",), "msg": str(e), "input": None}])
+
+def _persist_generation(doc: dict) -> None:
+    """Background insert for /api/generate; the client already has its response"""
+    try:
+        create_document('generation', doc)
+    except Exception:
+        logger.exception("Failed to persist generation %s", doc.get("_id"))
+
+@app.post(
+    "/api/generate",
+    response_class=MsgspecJSONResponse,
+    openapi_extra={
+        "requestBody": {
+            "content": {"application/json": {"schema": _GENERATE_REQUEST_SCHEMA}},
+            "required": True,
+        },
+    },
+    responses={200: {"content": {"application/json": {"schema": _GENERATE_RESPONSE_SCHEMA}}}},
+)
+async def generate_content(
+    background_tasks: BackgroundTasks,
+    payload: GenerateRequest = Depends(parse_generate_request),
+):
     """
     Mock generation endpoint that returns stylized content matching tone/sentiment/length.
     Persists request+result to DB as a Generation document.
     """
     # Simple heuristic generation to keep backend self-contained
-    tone_voice = {
-        "Professional": "Polished and concise.",
-        "Playful": "Light and witty.",
-        "Formal": "Respectful and structured.",
-        "Casual": "Friendly and direct.",
-    }.get(payload.tone, "Confident and clear.")
-
-    sentiment_hint = {
-        "Positive": "Emphasize benefits and momentum.",
-        "Neutral": "Stay informative and balanced.",
-        "Urgent": "Use action-forward phrasing.",
-    }.get(payload.sentiment, "Stay helpful.")
-
-    length_map = {
-        "Short": (18, 26),
-        "Medium": (40, 60),
-        "Long": (80, 120),
-    }
-    min_len, max_len = length_map.get(payload.length, (40, 60))
+    # tone/sentiment are validated enum members, so the tables cover every value
+    tone_voice = _TONE_VOICE[payload.tone]
+    sentiment_hint = _SENTIMENT_HINT[payload.sentiment]
+    is_urgent = payload.sentiment is Sentiment.URGENT
+    min_len, max_len = _LENGTH_MAP.get(payload.length, (40, 60))
 
     # Make a few variants
-    outputs: list[str] = []
     base = payload.prompt.strip() or "Your product or idea"
-    for i in range(payload.variants):
-        guide = f"{payload.tone} • {payload.sentiment} • {payload.length}. {tone_voice} {sentiment_hint}"
-        core = f"{base} — crafted with ContentForge to help you move faster."
-        # very lightweight pseudo-variation using creativity
-        exclaim = "!" if payload.sentiment == "Urgent" or payload.creativity > 0.6 else "."
-        suffix = " Take the next step today" if payload.sentiment == "Urgent" else ""
-        text = f"{core} {guide}{exclaim}{suffix}"
-        # Trim/expand heuristically
-        if len(text.split()) < min_len:
-            text = text + " " + " ".join(["Learn more.", "Discover why.", "Built for teams.", "Effortless.", "Reliable."][: max(0, min_len - len(text.split()))])
-        outputs.append(text[: max_len * 2])
-
-    # Persist to DB
-    try:
-        from schemas import Generation as GenerationModel
-        doc = GenerationModel(
-            prompt=payload.prompt,
-            tone=payload.tone,
-            sentiment=payload.sentiment,
-            length=payload.length,
-            creativity=payload.creativity,
-            variants=payload.variants,
-            result="\n\n".join(outputs),
-        )
-        inserted_id = create_document('generation', doc)
-    except Exception as e:
+    guide = f"{payload.tone.value} • {payload.sentiment.value} • {payload.length}. {tone_voice} {sentiment_hint}"
+    core = f"{base} — crafted with ContentForge to help you move faster."
+    # very lightweight pseudo-variation using creativity
+    exclaim = "!" if is_urgent or payload.creativity > 0.6 else "."
+    suffix = " Take the next step today" if is_urgent else ""
+    text = f"{core} {guide}{exclaim}{suffix}"
+    # Trim/expand heuristically; word count is derived from the parts rather
+    # than rescanning text (exclaim attaches to guide's last word)
+    text_words = (core.count(" ") + 1) + (guide.count(" ") + 1) + suffix.count(" ")
+    need = max(0, min(len(_FILLERS), min_len - text_words))
+    if need:
+        text = text + " " + _FILLER_PREFIX[need]
+    # Nothing above depends on the variant index, so every variant is the same
+    # string; build it once and repeat it
+    outputs: list[str] = [text[: max_len * 2]] * payload.variants
+
+    # Persist to DB in the background (payload is already validated, so write a
+    # plain dict; schemas.Generation documents the stored shape). The _id is
+    # generated here so the response does not wait on the insert.
+    if db is not None:
+        new_id = ObjectId()
+        doc = {
+            "_id": new_id,
+            "prompt": payload.prompt,
+            "tone": payload.tone.value,
+            "sentiment": payload.sentiment.value,
+            "length": payload.length,
+            "creativity": payload.creativity,
+            "variants": payload.variants,
+            "outputs": outputs,
+        }
+        background_tasks.add_task(_persist_generation, doc)
+        inserted_id = str(new_id)
+    else:
         # If DB is not available, still return outputs
         inserted_id = "no-db"
 
-    return {"id": inserted_id, "outputs": outputs}
+    return MsgspecJSONResponse(GenerateResponse(id=inserted_id, outputs=outputs))
+
+def _openapi():
+    """FastAPI's schema plus the msgspec component schemas referenced above"""
+    if app.openapi_schema is None:
+        schema = _base_openapi()
+        schema.setdefault("components", {}).setdefault("schemas", {}).update(_MSGSPEC_COMPONENTS)
+    return app.openapi_schema
+
+_base_openapi = app.openapi
+app.openapi = _openapi
 
 # Recent generations endpoint for Library panel
-class RecentItem(BaseModel):
-    id: str
-    prompt: str
-    created_at: Optional[str] = None
+# Fallback library items served when the DB is unavailable
+_MOCK_RECENT = [
+    {"id": f"mock-{i}", "prompt": p, "created_at": None}
+    for i, p in enumerate([
+        "Product Launch Tweet",
+        "Feature Update Email",
+        "SEO Blog Outline",
+    ], start=1)
+]
 
-@app.get("/api/recent", response_model=list[RecentItem])
-async def recent_generations(limit: int = 9):
-    """Return recent generation metadata for the library preview"""
-    items = []
+@app.get("/api/recent", response_model=None)
+async def recent_generations(request: Request, limit: int = 9):
+    """
+    Return recent generation metadata for the library preview.
+    Items are built from our own documents, so they are returned as plain dicts
+    without a response_model validation pass.
+    """
     try:
-        docs = get_recent_documents('generation', limit=limit)
-        for d in docs:
-            items.append({
-                "id": str(d.get('_id')),
+        # Cheap conditional check. The newest _id alone is not enough: ids are
+        # minted at request time and inserted later, so a smaller _id can land
+        # after a larger one. The document count changes on every insert.
+        latest_id, count = await run_in_threadpool(get_collection_version, 'generation')
+        etag = f'W/"{latest_id}-{count}-{limit}"'
+        headers = {"ETag": etag, "Cache-Control": "private, max-age=5"}
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        # Only fetch the fields the library needs (skips the outputs payload);
+        # _id order follows request time and is served by the _id_ index
+        docs = await run_in_threadpool(
+            get_recent_documents,
+            'generation',
+            limit=limit,
+            projection={'_id': 1, 'prompt': 1, 'created_at': 1},
+            sort=[('_id', DESCENDING)],
+        )
+        items = [
+            {
+                "id": d["_id"],  # stringified by the encoder
                 "prompt": d.get('prompt', 'Untitled'),
-                "created_at": d.get('created_at').isoformat() if d.get('created_at') else None,
-            })
+                # pymongo returns stored datetimes as naive UTC; match that for the fallback
+                "created_at": d.get('created_at') or d['_id'].generation_time.replace(tzinfo=None),
+            }
+            for d in docs
+        ]
     except Exception:
         # Fallback mocked items if DB unavailable
-        items = [
-            {"id": f"mock-{i}", "prompt": p, "created_at": None}
-            for i, p in enumerate([
-                "Product Launch Tweet",
-                "Feature Update Email",
-                "SEO Blog Outline",
-            ], start=1)
-        ]
-    return items
+        return MongoJSONResponse(_MOCK_RECENT)
+    return MongoJSONResponse(items, headers=headers)
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    # Import string (not the app object) is required for multiple workers
+    uvicorn.run("main:app", host="0.0.0.0", port=port, loop="uvloop", http="httptools", workers=workers)
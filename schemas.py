@@ -1,18 +1,23 @@
 """
 Database Schemas
 
-Define your MongoDB collection schemas here using Pydantic models.
-These schemas are used for data validation in your application.
+Define your MongoDB collection schemas here.
+Pydantic models (User, Product) are used for data validation in your application.
+Plain dataclasses (Generation) only document the shape of documents that are
+written as dicts from already-validated input; no code constructs them.
 
-Each Pydantic model represents a collection in your database.
+Each class represents a collection in your database.
 Model name is converted to lowercase for the collection name:
 - User -> "user" collection
 - Product -> "product" collection
 - BlogPost -> "blogs" collection
 """
 
+from dataclasses import dataclass, field
+from datetime import datetime
+from bson import ObjectId
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 
 # Example schemas (replace with your own):
 
@@ -41,15 +46,24 @@ class Product(BaseModel):
 # Add your own schemas here:
 # --------------------------------------------------
 
-class Generation(BaseModel):
+@dataclass(slots=True)
+class Generation:
     """
     Content generations created by the AI workflow
     Collection name: "generation"
+
+    Documents the stored shape only: /api/generate writes a plain dict
+    built from the already-validated request, so no model is constructed
+    (or re-validated) on the write path. _id is minted by /api/generate;
+    created_at/updated_at are stamped by database.create_document.
     """
-    prompt: str = Field(..., description="User prompt or brief")
-    tone: str = Field(..., description="Selected tone, e.g., Professional, Playful")
-    sentiment: str = Field(..., description="Selected sentiment, e.g., Positive, Neutral, Urgent")
-    length: str = Field('Medium', description="Output length: Short | Medium | Long")
-    creativity: float = Field(0.35, ge=0.0, le=1.0, description="Creativity/temperature 0–1")
-    variants: int = Field(1, ge=1, le=5, description="How many variants to generate")
-    result: Optional[str] = Field(None, description="Generated content text")
+    prompt: str  # User prompt or brief
+    tone: str  # Selected tone, e.g., Professional, Playful
+    sentiment: str  # Selected sentiment, e.g., Positive, Neutral, Urgent
+    length: str = 'Medium'  # Output length: Short | Medium | Long
+    creativity: float = 0.35  # Creativity/temperature 0–1
+    variants: int = 1  # How many variants to generate
+    outputs: List[str] = field(default_factory=list)  # Generated content variants
+    _id: Optional[ObjectId] = None  # Assigned at request time, before the insert
+    created_at: Optional[datetime] = None  # UTC, set on insert
+    updated_at: Optional[datetime] = None  # UTC, set on insert